@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List
+import asyncio
 import logging
 from models import Chapa, Item, TipoItem
 from otimizador_ortools import OtimizadorORTools
@@ -28,6 +29,7 @@ class OtimizacaoRequest(BaseModel):
     chapa: ChapaRequest
     min_aproveitamento: float = 0.95
     max_solucoes: int = 5
+    geracao_colunas: bool = False
 
 class PadraoResponse(BaseModel):
     num_padrao: int
@@ -108,9 +110,16 @@ async def otimizar_plano_corte(request: OtimizacaoRequest):
         
         logger.info(f"Iniciando otimização com {len(items_pedido)} items pedido")
         
-        otimizador = OtimizadorORTools(chapa, request.min_aproveitamento)
+        otimizador = OtimizadorORTools(
+            chapa,
+            request.min_aproveitamento,
+            geracao_colunas=request.geracao_colunas
+        )
         
-        solucoes = otimizador.otimizar(
+        # O solve é bloqueante: roda numa thread do pool para não travar
+        # o event loop enquanto outras requisições chegam
+        solucoes = await asyncio.to_thread(
+            otimizador.otimizar,
             items_pedido, 
             items_estoque,
             max_solucoes=request.max_solucoes
@@ -124,21 +133,10 @@ async def otimizar_plano_corte(request: OtimizacaoRequest):
         
         logger.info(f"Otimização concluída. {len(solucoes)} soluções geradas")
         
-        respostas = []
-        for sol in solucoes:
-            resumo = sol.resumo()
-            resp = SolucaoResponse(
-                ranking=resumo['ranking'],
-                aproveitamento=resumo['aproveitamento'],
-                chapas_necessarias=resumo['chapas_necessarias'],
-                padroes=[
-                    PadraoResponse(**p) 
-                    for p in resumo['padroes']
-                ]
-            )
-            respostas.append(resp)
-        
-        return respostas
+        # Os resumos já têm o formato de SolucaoResponse: o response_model
+        # valida e serializa direto para bytes JSON (Pydantic), sem montar
+        # os modelos de resposta aqui
+        return [sol.resumo() for sol in solucoes]
     
     except Exception as e:
         logger.error(f"Erro na otimização: {str(e)}")
@@ -1,7 +1,53 @@
-from itertools import combinations
-from typing import List, Set, Tuple
+from functools import lru_cache
+from itertools import combinations, product
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from gerador_padroes_kernels import enumerar_combinacoes, precificar_padrao
 from models import Chapa, Item, Padrao
 
+# Com ao menos esta quantidade de padrões de 1 e 2 comprimentos cobrindo
+# todos os códigos obrigatórios, as combinações de 3 comprimentos são puladas
+MIN_PADROES_SEM_3_COMPRIMENTOS = 200
+
+def _composicoes(total: int, partes: int) -> Iterator[List[int]]:
+    """Todas as formas de escrever total como soma ordenada de partes >= 1"""
+    for cortes in combinations(range(1, total), partes - 1):
+        limites = (0,) + cortes + (total,)
+        yield [fim - inicio for inicio, fim in zip(limites, limites[1:])]
+
+@lru_cache(maxsize=4096)
+def _distribuicoes(comprimentos: Tuple[int, ...], largura: int,
+                   num_comprimentos: int) -> Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]:
+    """
+    Distribuições exatas de todas as combinações de num_comprimentos
+    comprimentos distintos
+    
+    Fica em cache entre chamadas: pedidos repetidos com o mesmo conjunto
+    de comprimentos e a mesma chapa não voltam a enumerar
+    
+    Returns:
+        Tupla de pares (comprimentos da combinação, quantidades)
+    """
+    combos = np.array(
+        list(combinations(range(len(comprimentos)), num_comprimentos)),
+        dtype=np.int64
+    ).reshape(-1, num_comprimentos)
+    
+    if len(combos) == 0:
+        return ()
+    
+    indices, distribuicoes = enumerar_combinacoes(
+        np.array(comprimentos, dtype=np.int64), combos, largura
+    )
+    
+    combos_comprimentos = [
+        tuple(comprimentos[i] for i in combo) for combo in combos.tolist()
+    ]
+    return tuple(
+        (combos_comprimentos[c], tuple(quantidades))
+        for c, quantidades in zip(indices.tolist(), distribuicoes.tolist())
+    )
+
 class GeradorPadroes:
     """Gera todos os padrões válidos respeitando restrições"""
     
@@ -9,75 +55,185 @@ class GeradorPadroes:
         self.chapa = chapa
         self.min_aproveitamento = min_aproveitamento
         self.padroes_gerados: Set[Padrao] = set()
+        self.enumeracao_parcial = False
     
-    def gerar_padroes_validos(self, items: List[Item]) -> List[Padrao]:
+    def gerar_padroes_validos(self, items: List[Item],
+                              codigos_obrigatorios: Optional[Set[str]] = None) -> List[Padrao]:
         """
         Gera todos os padrões válidos combinando até 3 SKUs diferentes
         
         Args:
             items: Lista de items disponíveis (estoque + pedido)
+            codigos_obrigatorios: Códigos que precisam aparecer em algum
+                padrão (pedido). Se informados e já cobertos por padrões
+                suficientes de 1 e 2 comprimentos, as combinações de 3
+                comprimentos não são enumeradas (ver enumeracao_parcial)
         
         Returns:
             Lista de Padrao válidos (aproveitamento > min_aproveitamento)
         """
         padroes_validos = []
+        self.enumeracao_parcial = False
+        items = self._items_que_cabem(items)
+        
+        # Remove items repetidos e agrupa por comprimento: a enumeração só
+        # depende dos comprimentos distintos
+        grupos: Dict[int, List[Item]] = {}
+        vistos = set()
+        for item in items:
+            chave = (item.codigo, item.comprimento)
+            if chave not in vistos:
+                vistos.add(chave)
+                grupos.setdefault(item.comprimento, []).append(item)
+        
+        comprimentos = tuple(sorted(grupos, reverse=True))
         
-        # Gera combinações de até 3 SKUs distintos
-        for num_skus in range(1, 4):  # 1, 2 ou 3 SKUs
-            for combo_items in combinations(items, num_skus):
-                # Encontra todas as formas de distribuir esses SKUs
-                padroes = self._encontrar_distribuicoes(combo_items)
+        # Gera combinações de até 3 comprimentos distintos
+        for num_comprimentos in range(1, 4):
+            if num_comprimentos == 3 and self._cobertura_suficiente(
+                padroes_validos, codigos_obrigatorios
+            ):
+                self.enumeracao_parcial = True
+                break
+            
+            for comprimentos_combo, quantidades in _distribuicoes(
+                comprimentos, self.chapa.largura, num_comprimentos
+            ):
+                grupos_combo = [grupos[c] for c in comprimentos_combo]
                 
-                for padrao in padroes:
+                for items_padrao, qtds_padrao in self._atribuir_codigos(
+                    grupos_combo, quantidades
+                ):
+                    padrao = Padrao(
+                        items=items_padrao,
+                        quantidades=qtds_padrao,
+                        chapa=self.chapa
+                    )
+                    
                     if self._validar_padrao(padrao):
                         padroes_validos.append(padrao)
         
         return padroes_validos
     
-    def _encontrar_distribuicoes(self, items: Tuple[Item, ...]) -> List[Padrao]:
-        """
-        Para um conjunto de items, encontra todas as quantidades possíveis
-        que somam exatamente a largura da chapa
+    def _cobertura_suficiente(self, padroes: List[Padrao],
+                              codigos_obrigatorios: Optional[Set[str]]) -> bool:
+        """Padrões já gerados bastam: são muitos e cobrem todos os obrigatórios"""
+        if codigos_obrigatorios is None or len(padroes) < MIN_PADROES_SEM_3_COMPRIMENTOS:
+            return False
         
-        Usa programação dinâmica com backtracking
-        """
+        cobertos = {codigo for padrao in padroes for codigo in padrao.qtd_por_codigo}
+        return codigos_obrigatorios <= cobertos
+    
+    def padroes_iniciais(self, items: List[Item]) -> List[Padrao]:
+        """Padrões triviais (um único SKU por chapa) para a geração de colunas"""
         padroes = []
-        largura_alvo = self.chapa.largura
+        vistos = set()
         
-        def backtrack(idx: int, quantidades_atuais: List[int], soma_atual: int):
-            """Backtracking para encontrar combinações que somam exatamente"""
-            
-            # Caso base: chegou ao final ou soma = alvo
-            if idx == len(items):
-                if soma_atual == largura_alvo:
-                    padrao = Padrao(
-                        items=list(items),
-                        quantidades=quantidades_atuais.copy()
-                    )
-                    padroes.append(padrao)
-                return
-            
-            # Poda: se soma já ultrapassou, não continua
-            if soma_atual > largura_alvo:
-                return
+        for item in self._items_que_cabem(items):
+            if item.codigo in vistos or self.chapa.largura % item.comprimento:
+                continue
+            vistos.add(item.codigo)
             
-            item_atual = items[idx]
+            padrao = Padrao(
+                items=[item],
+                quantidades=[self.chapa.largura // item.comprimento],
+                chapa=self.chapa
+            )
+            if self._validar_padrao(padrao):
+                padroes.append(padrao)
+        
+        return padroes
+    
+    def precificar(self, items: List[Item], duais: Dict[str, float],
+                   limites: Dict[str, int]) -> Optional[Padrao]:
+        """
+        Resolve o subproblema de precificação: padrão de até 3 SKUs que
+        preenche a largura exatamente com o maior valor dual
+        
+        Args:
+            items: Lista de items disponíveis (estoque + pedido)
+            duais: Valor dual da restrição de demanda de cada código
+            limites: Quantidade máxima de cada código em um padrão
+        
+        Returns:
+            Padrao de maior valor dual, ou None se nenhum preenche a chapa
+        """
+        # Um item por código: o dual pertence à restrição do código
+        por_codigo: Dict[str, Item] = {}
+        for item in self._items_que_cabem(items):
+            if item.codigo in duais and limites.get(item.codigo, 0) > 0:
+                por_codigo.setdefault(item.codigo, item)
+        
+        candidatos = list(por_codigo.values())
+        if not candidatos:
+            return None
+        
+        quantidades, valor = precificar_padrao(
+            np.array([item.comprimento for item in candidatos], dtype=np.int64),
+            np.array([duais[item.codigo] for item in candidatos], dtype=np.float64),
+            np.array([limites[item.codigo] for item in candidatos], dtype=np.int64),
+            self.chapa.largura,
+            3
+        )
+        
+        if valor == -np.inf:
+            return None
+        
+        usados = np.nonzero(quantidades)[0]
+        return Padrao(
+            items=[candidatos[i] for i in usados],
+            quantidades=quantidades[usados].tolist(),
+            chapa=self.chapa
+        )
+    
+    def _items_que_cabem(self, items: List[Item]) -> List[Item]:
+        """
+        Descarta items que não cabem na chapa (ou de comprimento inválido)
+        e ordena do maior para o menor comprimento, o que encurta os laços
+        externos da enumeração
+        """
+        return sorted(
+            (item for item in items
+             if 0 < item.comprimento <= self.chapa.largura),
+            key=lambda item: item.comprimento,
+            reverse=True
+        )
+    
+    def _atribuir_codigos(self, grupos: List[List[Item]],
+                          quantidades: List[int]) -> List[Tuple[List[Item], List[int]]]:
+        """
+        Expande uma distribuição por comprimento em padrões por código
+        
+        Cada comprimento pode ser dividido entre códigos que compartilham
+        esse comprimento, desde que o padrão mantenha no máximo 3 SKUs
+        """
+        # Códigos extras disponíveis além de 1 por comprimento
+        folga_skus = 3 - len(grupos)
+        
+        opcoes_por_comprimento = []
+        for grupo, qtd in zip(grupos, quantidades):
+            if len(grupo) == 1:
+                opcoes_por_comprimento.append([(grupo, [qtd])])
+                continue
             
-            # Calcula máxima quantidade possível do item atual
-            espaco_restante = largura_alvo - soma_atual
-            max_quantidade = espaco_restante // item_atual.comprimento
+            opcoes = []
+            for num_codigos in range(1, min(len(grupo), qtd, folga_skus + 1) + 1):
+                for codigos in combinations(grupo, num_codigos):
+                    for divisao in _composicoes(qtd, num_codigos):
+                        opcoes.append((list(codigos), divisao))
+            opcoes_por_comprimento.append(opcoes)
+        
+        atribuicoes = []
+        for escolha in product(*opcoes_por_comprimento):
+            items_padrao = [item for codigos, _ in escolha for item in codigos]
             
-            # Tenta todas as quantidades possíveis
-            for qtd in range(max_quantidade + 1):
-                quantidades_atuais.append(qtd)
-                nova_soma = soma_atual + qtd * item_atual.comprimento
-                
-                backtrack(idx + 1, quantidades_atuais, nova_soma)
-                
-                quantidades_atuais.pop()
+            if len(items_padrao) <= 3:
+                atribuicoes.append((
+                    items_padrao,
+                    [qtd for _, divisao in escolha for qtd in divisao]
+                ))
         
-        backtrack(0, [], 0)
-        return padroes
+        return atribuicoes
     
     def _validar_padrao(self, padrao: Padrao) -> bool:
         """Valida se padrão atende todas as restrições"""
@@ -91,12 +247,7 @@ class GeradorPadroes:
             return False
         
         # Restrição 3: Aproveitamento > 95%
-        aproveitamento = padrao.soma_largura / self.chapa.largura
-        if aproveitamento < self.min_aproveitamento:
-            return False
-        
-        # Restrição 4: Nenhuma quantidade pode ser negativa
-        if any(qtd < 0 for qtd in padrao.quantidades):
+        if padrao.aproveitamento < self.min_aproveitamento:
             return False
         
         return True
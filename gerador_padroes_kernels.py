@@ -0,0 +1,167 @@
+import os
+import numpy as np
+from numba import config, njit, prange
+
+# O pool TBB (quando instalado) trava no encerramento do processo se o
+# kernel paralelo é disparado fora da thread principal (ex.: TestClient do
+# FastAPI). Só a prioridade é ajustada, preferindo OpenMP: se ele não puder
+# ser carregado o Numba cai para outra camada, e um NUMBA_THREADING_LAYER
+# definido pelo operador é respeitado
+if 'NUMBA_THREADING_LAYER' not in os.environ:
+    config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+
+@njit(cache=True)
+def _distribuir(comprimentos: np.ndarray, largura: int,
+                saida: np.ndarray, inicio: int, gravar: bool) -> int:
+    """
+    Percorre as quantidades (>= 1 por item) de até 3 comprimentos que
+    somam exatamente a largura
+    
+    Com gravar=False apenas conta; com gravar=True escreve as
+    distribuições em saida[inicio:]
+    
+    Returns:
+        Número de distribuições encontradas
+    """
+    k = comprimentos.shape[0]
+    l1 = comprimentos[0]
+    count = 0
+    
+    if k == 1:
+        if largura % l1 == 0:
+            if gravar:
+                saida[inicio, 0] = largura // l1
+            count = 1
+        return count
+    
+    l2 = comprimentos[1]
+    
+    if k == 2:
+        # Reserva espaço para ao menos 1 unidade do segundo item
+        for q1 in range(1, (largura - l2) // l1 + 1):
+            resto = largura - q1 * l1
+            if resto % l2 == 0:
+                if gravar:
+                    saida[inicio + count, 0] = q1
+                    saida[inicio + count, 1] = resto // l2
+                count += 1
+        return count
+    
+    l3 = comprimentos[2]
+    
+    for q1 in range(1, (largura - l2 - l3) // l1 + 1):
+        resto1 = largura - q1 * l1
+        
+        for q2 in range(1, (resto1 - l3) // l2 + 1):
+            resto = resto1 - q2 * l2
+            if resto % l3 == 0:
+                if gravar:
+                    saida[inicio + count, 0] = q1
+                    saida[inicio + count, 1] = q2
+                    saida[inicio + count, 2] = resto // l3
+                count += 1
+    
+    return count
+
+
+@njit(cache=True, parallel=True)
+def enumerar_combinacoes(comprimentos: np.ndarray, combos: np.ndarray,
+                         largura: int):
+    """
+    Enumera, em paralelo, as distribuições de todas as combinações de
+    comprimentos
+    
+    Args:
+        comprimentos: Array int64 com o comprimento de cada item
+        combos: Array int64 (n_combos, k) com índices em comprimentos
+        largura: Largura alvo da chapa
+    
+    Returns:
+        Tupla (indices, quantidades): índice da combinação de cada
+        distribuição e array int32 (n_distribuicoes, k) com as quantidades
+    """
+    n_combos, k = combos.shape
+    vazio = np.empty((0, k), dtype=np.int32)
+    
+    # Passo 1: conta as distribuições de cada combinação
+    contagens = np.zeros(n_combos, dtype=np.int64)
+    for c in prange(n_combos):
+        contagens[c] = _distribuir(comprimentos[combos[c]], largura, vazio, 0, False)
+    
+    offsets = np.zeros(n_combos + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(contagens)
+    
+    # Passo 2: cada combinação grava na sua fatia do buffer
+    indices = np.empty(offsets[n_combos], dtype=np.int32)
+    quantidades = np.empty((offsets[n_combos], k), dtype=np.int32)
+    for c in prange(n_combos):
+        _distribuir(comprimentos[combos[c]], largura, quantidades, offsets[c], True)
+        indices[offsets[c]:offsets[c + 1]] = c
+    
+    return indices, quantidades
+
+
+@njit(cache=True)
+def precificar_padrao(comprimentos: np.ndarray, duais: np.ndarray,
+                      limites: np.ndarray, largura: int, max_skus: int):
+    """
+    Subproblema de precificação da geração de colunas: mochila limitada
+    que maximiza sum(duais * q) com sum(comprimentos * q) == largura,
+    q <= limites e no máximo max_skus itens com q > 0
+    
+    Args:
+        comprimentos: Array int64 com o comprimento de cada item
+        duais: Array float64 com o valor dual de cada item
+        limites: Array int64 com a quantidade máxima de cada item
+        largura: Largura alvo da chapa
+        max_skus: Máximo de itens distintos no padrão
+    
+    Returns:
+        Tupla (quantidades, valor): array int32 com a quantidade de cada
+        item e o valor dual do padrão (-inf se não houver padrão exato)
+    """
+    n = comprimentos.shape[0]
+    
+    # melhor[k, w]: maior valor usando k itens distintos e largura exata w
+    melhor = np.full((max_skus + 1, largura + 1), -np.inf)
+    melhor[0, 0] = 0.0
+    
+    # escolha[i, k, w]: quantidade do item i que melhorou o estado (k, w)
+    escolha = np.zeros((n, max_skus + 1, largura + 1), dtype=np.int32)
+    
+    for i in range(n):
+        l = comprimentos[i]
+        anterior = melhor.copy()
+        
+        for k in range(max_skus):
+            for w in range(largura - l + 1):
+                if anterior[k, w] == -np.inf:
+                    continue
+                
+                for q in range(1, min((largura - w) // l, limites[i]) + 1):
+                    valor = anterior[k, w] + q * duais[i]
+                    if valor > melhor[k + 1, w + q * l]:
+                        melhor[k + 1, w + q * l] = valor
+                        escolha[i, k + 1, w + q * l] = q
+    
+    quantidades = np.zeros(n, dtype=np.int32)
+    k = 1
+    for j in range(2, max_skus + 1):
+        if melhor[j, largura] > melhor[k, largura]:
+            k = j
+    
+    valor = melhor[k, largura]
+    if valor == -np.inf:
+        return quantidades, valor
+    
+    # Reconstrói o padrão do último item para o primeiro
+    w = largura
+    for i in range(n - 1, -1, -1):
+        q = escolha[i, k, w]
+        if q > 0:
+            quantidades[i] = q
+            w -= q * comprimentos[i]
+            k -= 1
+    
+    return quantidades, valor
@@ -1,12 +1,12 @@
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
 class TipoItem(Enum):
     ESTOQUE = "estoque"
     PEDIDO = "pedido"
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     codigo: str
     comprimento: int
@@ -21,7 +21,7 @@ class Item:
     def __eq__(self, other):
         return self.codigo == other.codigo
 
-@dataclass
+@dataclass(slots=True)
 class Chapa:
     largura: int
     comprimento: int
@@ -32,24 +32,41 @@ class Chapa:
     def area_disponivel(self) -> int:
         return self.largura * self.comprimento
 
-@dataclass
+@dataclass(slots=True)
 class Padrao:
     items: List[Item] = field(default_factory=list)
-    quantidades: List[int] = field(default_factory=list)
+    quantidades: Tuple[int, ...] = ()
     chapa: Optional[Chapa] = None
     
+    # Calculados na construção: padrões são imutáveis após gerados e estes
+    # são os campos lidos nos laços quentes (validação, matriz, mestre)
+    qtd_por_codigo: Dict[str, int] = field(init=False, compare=False)
+    soma_largura: int = field(init=False, compare=False)
+    aproveitamento: float = field(init=False, compare=False)
+    
+    def __post_init__(self):
+        self.quantidades = quantidades = tuple(self.quantidades)
+        qtd_por_codigo = {}
+        soma_largura = 0
+        for item, qtd in zip(self.items, quantidades):
+            qtd_por_codigo[item.codigo] = qtd_por_codigo.get(item.codigo, 0) + qtd
+            soma_largura += item.comprimento * qtd
+        self.qtd_por_codigo = qtd_por_codigo
+        self.soma_largura = soma_largura
+        self.aproveitamento = (soma_largura / self.chapa.largura 
+                               if self.chapa else 0.0)
+    
     @property
-    def soma_largura(self) -> int:
-        return sum(item.comprimento * qtd 
-                  for item, qtd in zip(self.items, self.quantidades))
+    def codigos(self) -> Tuple[str, ...]:
+        return tuple(item.codigo for item in self.items)
     
     @property
-    def num_skus(self) -> int:
-        return len(set(item.codigo for item in self.items))
+    def comprimentos(self) -> Tuple[int, ...]:
+        return tuple(item.comprimento for item in self.items)
     
     @property
-    def aproveitamento(self) -> float:
-        return self.soma_largura / self.chapa.largura if self.chapa else 0.0
+    def num_skus(self) -> int:
+        return len(self.qtd_por_codigo)
     
     def is_valido(self, chapa: Chapa, min_aproveitamento: float = 0.95) -> bool:
         if self.soma_largura > chapa.largura:
@@ -77,8 +94,8 @@ class SolucaoOtimizacao:
             "padroes": [
                 {
                     "num_padrao": i,
-                    "items": [item.codigo for item in padrao.items],
-                    "quantidades": padrao.quantidades,
+                    "items": list(padrao.codigos),
+                    "quantidades": list(padrao.quantidades),
                     "aproveitamento": f"{padrao.aproveitamento:.2%}",
                     "soma_largura": padrao.soma_largura
                 }
@@ -1,9 +1,43 @@
-from ortools.linear_solver import pywraplp
+from ortools.linear_solver import linear_solver_pb2, pywraplp
+import numpy as np
+from scipy.sparse import csr_matrix
 from typing import List, Dict, Optional, Tuple
+import threading
 import time
 from gerador_padroes import GeradorPadroes
 from models import Chapa, Item, Padrao, SolucaoOtimizacao
 
+# Geração de colunas: custo das folgas artificiais do mestre (bem acima do
+# custo de 1 chapa) e limite de iterações de precificação
+PENALIDADE_FOLGA = 1e4
+MAX_ITERACOES_COLUNAS = 500
+
+# Um solver por thread, reaproveitado entre requisições (Clear() antes de
+# cada modelo) em vez de criado e destruído a cada otimização
+_tls = threading.local()
+
+def _obter_solver() -> Tuple[pywraplp.Solver, bool]:
+    """
+    Retorna o solver da thread atual, criando-o na primeira chamada
+    
+    Returns:
+        Tupla (solver, relaxado): relaxado indica que não há HiGHS e o
+        solver é o GLOP, que resolve só a relaxação linear
+    """
+    if not hasattr(_tls, 'solver'):
+        _tls.solver = pywraplp.Solver.CreateSolver('HIGHS')
+        
+        # Sem HiGHS, resolve a relaxação linear com GLOP e arredonda
+        _tls.relaxado = _tls.solver is None
+        if _tls.relaxado:
+            _tls.solver = pywraplp.Solver.CreateSolver('GLOP')
+        else:
+            # O HiGHS imprime um banner no stdout a cada Solve(); os
+            # parâmetros sobrevivem ao Clear() entre requisições
+            _tls.solver.SetSolverSpecificParametersAsString('output_flag=false')
+
+    return _tls.solver, _tls.relaxado
+
 class OtimizadorORTools:
     """
     Resolver usando OR-Tools Linear Optimizer
@@ -15,10 +49,11 @@ class OtimizadorORTools:
                    aproveitamento > 95%
     """
     
-    def __init__(self, chapa: Chapa, min_aproveitamento: float = 0.95):
+    def __init__(self, chapa: Chapa, min_aproveitamento: float = 0.95,
+                 geracao_colunas: bool = False):
         self.chapa = chapa
         self.min_aproveitamento = min_aproveitamento
-        self.solver = pywraplp.Solver.CreateSolver('CBC')
+        self.geracao_colunas = geracao_colunas
     
     def otimizar(self, items_pedido: List[Item], 
                  items_estoque: List[Item],
@@ -37,16 +72,12 @@ class OtimizadorORTools:
         
         inicio = time.time()
         
-        todos_items = items_pedido + items_estoque
-        gerador = GeradorPadroes(self.chapa, self.min_aproveitamento)
-        padroes_validos = gerador.gerar_padroes_validos(todos_items)
+        # Obtido aqui, e não no __init__, para usar o solver da thread que
+        # de fato executa a otimização. Fica local (não vai para self): a
+        # mesma instância usada em duas threads não compartilha o solver
+        solver, relaxado = _obter_solver()
         
-        if not padroes_validos:
-            return [SolucaoOtimizacao(
-                padroes=[],
-                tempo_processamento_ms=0,
-                items_cobertos={}
-            )]
+        todos_items = items_pedido + items_estoque
         
         # Define restrições de quantidade para cada código
         restricoes = {}
@@ -65,6 +96,62 @@ class OtimizadorORTools:
                 'max': item.quantidade
             }
         
+        gerador = GeradorPadroes(self.chapa, self.min_aproveitamento)
+        
+        padroes_validos = None
+        if self.geracao_colunas:
+            padroes_validos = self._gerar_colunas(gerador, todos_items, restricoes)
+        
+        # Sem geração de colunas, ou quando ela não fecha a demanda,
+        # enumera os padrões
+        if padroes_validos is None:
+            padroes_validos = gerador.gerar_padroes_validos(
+                todos_items,
+                codigos_obrigatorios={item.codigo for item in items_pedido}
+            )
+        
+        if not padroes_validos:
+            return [SolucaoOtimizacao(
+                padroes=[],
+                tempo_processamento_ms=0,
+                items_cobertos={}
+            )]
+        
+        solucoes = self._resolver_estrategias(
+            solver, relaxado, padroes_validos, restricoes, items_pedido,
+            max_solucoes
+        )
+        
+        # A enumeração pulou as combinações de 3 comprimentos e nada foi
+        # viável: repete com todos os padrões
+        if not solucoes and gerador.enumeracao_parcial:
+            padroes_validos = gerador.gerar_padroes_validos(todos_items)
+            solucoes = self._resolver_estrategias(
+                solver, relaxado, padroes_validos, restricoes, items_pedido,
+                max_solucoes
+            )
+        
+        solucoes.sort(key=lambda x: x.aproveitamento_total, reverse=True)
+        
+        for i, sol in enumerate(solucoes, 1):
+            sol.ranking = i
+            sol.tempo_processamento_ms = (time.time() - inicio) * 1000
+        
+        return solucoes[:max_solucoes]
+    
+    def _resolver_estrategias(self, solver: pywraplp.Solver, relaxado: bool,
+                              padroes_validos: List[Padrao],
+                              restricoes: Dict[str, Dict[str, int]],
+                              items_pedido: List[Item],
+                              max_solucoes: int) -> List[SolucaoOtimizacao]:
+        """Resolve o modelo para cada estratégia sobre o mesmo conjunto de padrões"""
+        
+        # Matriz esparsa código x padrão, montada uma única vez para todas
+        # as estratégias
+        coeficientes = self._montar_matriz_coeficientes(
+            padroes_validos, list(restricoes)
+        )
+        
         solucoes = []
         
         estrategias = [
@@ -73,106 +160,380 @@ class OtimizadorORTools:
             ("balanceado", 0.7),
         ]
         
-        for estrategia_nome, peso_aproveitamento in estrategias[:max_solucoes]:
-            self.solver.Clear()
-            solucao = self._resolver_modelo(
-                padroes_validos, 
-                restricoes,
-                peso_aproveitamento, 
-                estrategia_nome,
-                items_pedido
+        # Variáveis e restrições de demanda são iguais em todas as
+        # estratégias: o modelo é montado uma vez e só o objetivo muda
+        solver.Clear()
+        try:
+            x = self._construir_modelo(
+                solver, relaxado, padroes_validos, restricoes, coeficientes
             )
             
-            if solucao:
-                solucoes.append(solucao)
+            for estrategia_nome, peso_aproveitamento in estrategias[:max_solucoes]:
+                self._definir_objetivo(
+                    solver,
+                    x,
+                    padroes_validos,
+                    peso_aproveitamento,
+                    estrategia_nome
+                )
+                solucao = self._resolver_modelo(
+                    solver,
+                    relaxado,
+                    x,
+                    padroes_validos, 
+                    restricoes,
+                    coeficientes,
+                    items_pedido
+                )
+                
+                if solucao:
+                    solucoes.append(solucao)
+        finally:
+            # O solver da thread fica para a próxima requisição, mas sem
+            # manter o modelo (colunas e restrições) carregado até lá
+            solver.Clear()
         
-        solucoes.sort(key=lambda x: x.aproveitamento_total, reverse=True)
+        return solucoes
+    
+    def _gerar_colunas(self, gerador: GeradorPadroes,
+                       items: List[Item],
+                       restricoes: Dict[str, Dict[str, int]]) -> Optional[List[Padrao]]:
+        """
+        Geração de colunas (Gilmore-Gomory): em vez de enumerar todos os
+        padrões, gera só os padrões úteis à relaxação linear
         
-        for i, sol in enumerate(solucoes, 1):
-            sol.ranking = i
-            sol.tempo_processamento_ms = (time.time() - inicio) * 1000
+        Com demanda exata, o mestre relaxado convergido raramente tem
+        solução inteira nos padrões gerados. Por isso fixa a parte inteira
+        da solução, desconta da demanda e repete sobre a demanda residual,
+        garantindo que os padrões gerados contêm um plano inteiro viável
         
-        return solucoes[:max_solucoes]
+        Returns:
+            Padrões gerados, usados depois no modelo inteiro, ou None se a
+            demanda residual não pôde ser fechada
+        """
+        residual = {codigo: dict(limites) for codigo, limites in restricoes.items()}
+        colunas: List[Padrao] = []
+        
+        # Um único mestre GLOP para todas as rodadas, limpo a cada uma
+        mestre = pywraplp.Solver.CreateSolver('GLOP')
+        
+        # Sem colunas (ex.: demanda já nula) devolve None, para que
+        # otimizar recorra à enumeração completa
+        for _ in range(MAX_ITERACOES_COLUNAS):
+            if all(limites['min'] <= 0 for limites in residual.values()):
+                return colunas or None
+            
+            valores = self._resolver_mestre(mestre, gerador, items, residual, colunas)
+            if valores is None:
+                return None
+            
+            usos = np.floor(valores + 1e-6).astype(np.int64)
+            
+            # Nada inteiro: usa uma vez o padrão de maior valor, que cabe
+            # na demanda residual por construção do mestre
+            if usos.sum() == 0:
+                usos[int(np.argmax(valores))] = 1
+            
+            for j in np.nonzero(usos)[0]:
+                for codigo, qtd in colunas[j].qtd_por_codigo.items():
+                    if codigo in residual:
+                        usado = qtd * int(usos[j])
+                        residual[codigo]['min'] = max(residual[codigo]['min'] - usado, 0)
+                        residual[codigo]['max'] -= usado
+        
+        if all(limites['min'] <= 0 for limites in residual.values()):
+            return colunas or None
+        return None
     
-    def _resolver_modelo(self, padroes: List[Padrao], 
-                        restricoes: Dict[str, Dict[str, int]],
-                        peso_aproveitamento: float,
-                        estrategia: str,
-                        items_pedido_ref: List[Item]) -> Optional[SolucaoOtimizacao]:
+    def _resolver_mestre(self, mestre: pywraplp.Solver,
+                         gerador: GeradorPadroes,
+                         items: List[Item],
+                         restricoes: Dict[str, Dict[str, int]],
+                         colunas: List[Padrao]) -> Optional[np.ndarray]:
+        """
+        Resolve o mestre relaxado (GLOP, minimizar chapas) adicionando a
+        'colunas', a cada iteração, o padrão de custo reduzido negativo
+        encontrado pela precificação
         
-        # Variáveis: quantas vezes usar cada padrão
-        x = {}
-        for i, padrao in enumerate(padroes):
-            x[i] = self.solver.IntVar(0, 1000, f'padrao_{i}')
+        Returns:
+            Valor de cada coluna na solução relaxada, ou None se o mestre
+            só é viável com folgas artificiais
+        """
+        # O mestre é refeito a cada rodada residual: além dos limites das
+        # restrições e das folgas, mudam os limites das próprias colunas
+        # (as que deixaram de caber ficam fixas em zero). As colunas já
+        # geradas são mantidas, então a precificação só complementa o
+        # conjunto e as rodadas seguintes convergem em poucas iterações
+        mestre.Clear()
+        objetivo = mestre.Objective()
+        objetivo.SetMinimization()
         
-        # Aplica restrições para todos os itens (Pedido e Estoque)
+        # Folgas artificiais garantem um mestre viável mesmo quando os
+        # padrões atuais não cobrem a demanda mínima
+        restricoes_mestre = {}
+        folgas = []
         for codigo, limites in restricoes.items():
-            constraint = self.solver.Constraint(
-                float(limites['min']), 
-                float(limites['max']), 
+            constraint = mestre.Constraint(
+                float(limites['min']),
+                float(limites['max']),
                 f'restricao_{codigo}'
             )
+            folga = mestre.NumVar(0, float(limites['min']), f'folga_{codigo}')
+            constraint.SetCoefficient(folga, 1.0)
+            objetivo.SetCoefficient(folga, PENALIDADE_FOLGA)
+            restricoes_mestre[codigo] = constraint
+            folgas.append(folga)
+        
+        x = []
+        
+        def cabe(padrao: Padrao) -> bool:
+            return all(qtd <= restricoes[codigo]['max']
+                       for codigo, qtd in padrao.qtd_por_codigo.items()
+                       if codigo in restricoes)
+        
+        def adicionar_coluna(padrao: Padrao):
+            # Padrões que estouram a demanda máxima ficam fixos em zero: a
+            # solução relaxada só combina padrões utilizáveis ao menos 1 vez
+            limite = mestre.infinity() if cabe(padrao) else 0.0
+            var = mestre.NumVar(0, limite, f'padrao_{len(x)}')
+            objetivo.SetCoefficient(var, 1.0)
+            for codigo, qtd in padrao.qtd_por_codigo.items():
+                if codigo in restricoes_mestre:
+                    restricoes_mestre[codigo].SetCoefficient(var, qtd)
+            x.append(var)
+        
+        if not colunas:
+            colunas.extend(
+                padrao for padrao in gerador.padroes_iniciais(items) if cabe(padrao)
+            )
+        
+        for padrao in colunas:
+            adicionar_coluna(padrao)
+        
+        limites = {codigo: lim['max'] for codigo, lim in restricoes.items()}
+        
+        for _ in range(MAX_ITERACOES_COLUNAS):
+            if mestre.Solve() != pywraplp.Solver.OPTIMAL:
+                return None
             
-            for i, padrao in enumerate(padroes):
-                # Soma a quantidade deste item presente no padrão atual
-                qtd_no_padrao = sum(
-                    qtd for item, qtd in zip(padrao.items, padrao.quantidades)
-                    if item.codigo == codigo
-                )
-                
-                if qtd_no_padrao > 0:
-                    constraint.SetCoefficient(x[i], qtd_no_padrao)
+            duais = {
+                codigo: constraint.dual_value()
+                for codigo, constraint in restricoes_mestre.items()
+            }
+            padrao = gerador.precificar(items, duais, limites)
+            if padrao is None:
+                break
+            
+            # Custo reduzido = 1 - valor dual; para quando não é negativo
+            valor = sum(duais[codigo] * qtd
+                        for codigo, qtd in padrao.qtd_por_codigo.items())
+            if valor <= 1.0 + 1e-9:
+                break
+            
+            colunas.append(padrao)
+            adicionar_coluna(padrao)
+        
+        if any(folga.solution_value() > 1e-6 for folga in folgas):
+            return None
+        
+        return np.array([var.solution_value() for var in x])
+    
+    def _montar_matriz_coeficientes(self, padroes: List[Padrao],
+                                    codigos: List[str]) -> csr_matrix:
+        """
+        Monta A[código, padrão] = quantidade do código no padrão
+        
+        Linhas seguem a ordem de 'codigos'; códigos sem restrição são ignorados
+        """
+        indice_codigo = {codigo: i for i, codigo in enumerate(codigos)}
+        linhas, colunas, valores = [], [], []
+        
+        for j, padrao in enumerate(padroes):
+            for codigo, qtd in padrao.qtd_por_codigo.items():
+                linha = indice_codigo.get(codigo)
+                if linha is not None and qtd > 0:
+                    linhas.append(linha)
+                    colunas.append(j)
+                    valores.append(qtd)
+        
+        return csr_matrix(
+            (valores, (linhas, colunas)),
+            shape=(len(codigos), len(padroes))
+        )
+    
+    def _construir_modelo(self, solver: pywraplp.Solver, relaxado: bool,
+                          padroes: List[Padrao],
+                          restricoes: Dict[str, Dict[str, int]],
+                          coeficientes: csr_matrix) -> Dict[int, pywraplp.Variable]:
+        """
+        Cria as variáveis de uso dos padrões e as restrições de demanda
+        
+        O modelo é montado como MPModelProto direto da matriz esparsa e
+        carregado de uma vez no solver, evitando uma chamada Python -> C++
+        por coeficiente
+        """
+        modelo = linear_solver_pb2.MPModelProto()
+        
+        # Variáveis: quantas vezes usar cada padrão. O limite superior é o
+        # maior uso que não estoura a demanda máxima de nenhum código do
+        # padrão, bem mais justo que um teto fixo
+        for i, padrao in enumerate(padroes):
+            var = modelo.variable.add()
+            var.name = f'padrao_{i}'
+            var.lower_bound = 0
+            var.upper_bound = min(
+                (restricoes[codigo]['max'] // qtd
+                 for codigo, qtd in padrao.qtd_por_codigo.items()
+                 if qtd > 0 and codigo in restricoes),
+                default=1000
+            )
+            var.is_integer = not relaxado
+        
+        # Aplica restrições para todos os itens (Pedido e Estoque)
+        for c, (codigo, limites) in enumerate(restricoes.items()):
+            constraint = modelo.constraint.add()
+            constraint.name = f'restricao_{codigo}'
+            constraint.lower_bound = float(limites['min'])
+            constraint.upper_bound = float(limites['max'])
+            
+            # Só os padrões que contêm o código (linha c de A)
+            inicio, fim = coeficientes.indptr[c], coeficientes.indptr[c + 1]
+            constraint.var_index.extend(coeficientes.indices[inicio:fim].tolist())
+            constraint.coefficient.extend(
+                coeficientes.data[inicio:fim].astype(float).tolist()
+            )
         
-        # Função Objetivo
-        objetivo = self.solver.Objective()
+        erro = solver.LoadModelFromProto(modelo)
+        if erro:
+            raise RuntimeError(f"Falha ao carregar o modelo no solver: {erro}")
+        
+        return dict(enumerate(solver.variables()))
+    
+    def _definir_objetivo(self, solver: pywraplp.Solver,
+                          x: Dict[int, pywraplp.Variable],
+                          padroes: List[Padrao],
+                          peso_aproveitamento: float,
+                          estrategia: str):
+        """Reescreve a função objetivo do modelo já construído"""
+        objetivo = solver.Objective()
+        objetivo.Clear()
         
         if estrategia == "minimizar_chapas":
             for i in x:
                 objetivo.SetCoefficient(x[i], 1.0)
         else:
             for i, padrao in enumerate(padroes):
-                aproveitamento = padrao.soma_largura / self.chapa.largura
-                objetivo.SetCoefficient(x[i], -aproveitamento)
+                objetivo.SetCoefficient(x[i], -padrao.aproveitamento)
         
         objetivo.SetMinimization()
+    
+    def _resolver_modelo(self, solver: pywraplp.Solver, relaxado: bool,
+                        x: Dict[int, pywraplp.Variable],
+                        padroes: List[Padrao], 
+                        restricoes: Dict[str, Dict[str, int]],
+                        coeficientes: csr_matrix,
+                        items_pedido_ref: List[Item]) -> Optional[SolucaoOtimizacao]:
         
-        status = self.solver.Solve()
+        status = solver.Solve()
         
         if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
             return None
         
-        padroes_usados = []
-        for i in x:
-            if x[i].solution_value() > 0.5:
-                qtd_uso = int(round(x[i].solution_value()))
-                padroes_usados.append((padroes[i], qtd_uso))
+        valores = np.array([x[i].solution_value() for i in x])
+        
+        if relaxado:
+            usos = self._arredondar_solucao(valores, restricoes, coeficientes)
+            if usos is None:
+                return None
+        else:
+            usos = np.rint(valores).astype(np.int64)
+        
+        padroes_usados = [
+            (padroes[i], int(qtd_uso))
+            for i, qtd_uso in enumerate(usos) if qtd_uso > 0
+        ]
         
         solucao = self._montar_solucao(padroes_usados, items_pedido_ref)
         return solucao
     
-    def _montar_solucao(self, padroes_usados: List[Tuple[Padrao, int]],
-                       items_pedido: List[Item]) -> SolucaoOtimizacao:
+    def _arredondar_solucao(self, valores: np.ndarray,
+                            restricoes: Dict[str, Dict[str, int]],
+                            coeficientes: csr_matrix) -> Optional[np.ndarray]:
+        """
+        Converte a solução da relaxação linear em usos inteiros
         
-        padroes_finais = []
-        items_cobertos = {}
-        aproveitamento_total = 0.0
+        Arredonda para baixo (nunca viola os máximos) e repara os déficits
+        incrementando, a cada passo, o padrão que mais cobre o déficit do
+        código mais descoberto entre os que não estouram nenhum máximo
         
-        for padrao, qtd_uso in padroes_usados:
-            padroes_finais.append(padrao)
+        Returns:
+            Usos inteiros, ou None se o reparo não chega a um plano que
+            respeite todas as restrições de demanda
+        """
+        minimos = np.array([lim['min'] for lim in restricoes.values()])
+        maximos = np.array([lim['max'] for lim in restricoes.values()])
+        
+        usos = np.floor(valores + 1e-6).astype(np.int64)
+        cobertura = coeficientes @ usos
+        deficit = minimos - cobertura
+        
+        while deficit.max(initial=0) > 0:
+            c = int(deficit.argmax())
+            candidatos = coeficientes.indices[
+                coeficientes.indptr[c]:coeficientes.indptr[c + 1]
+            ]
             
-            for item, qtd_item in zip(padrao.items, padrao.quantidades):
-                items_cobertos[item.codigo] = items_cobertos.get(item.codigo, 0) + qtd_item
+            colunas = coeficientes[:, candidatos].toarray()
+            cabe = np.all(cobertura[:, None] + colunas <= maximos[:, None], axis=0)
             
-            aproveitamento_total += padrao.aproveitamento * qtd_uso
+            # Só padrões que respeitam os máximos; sem nenhum, não há reparo
+            if not cabe.any():
+                return None
+            
+            ganho = np.minimum(colunas, np.maximum(deficit, 0)[:, None]).sum(axis=0)
+            melhor = int(np.argmax(np.where(cabe, ganho, -1)))
+            usos[candidatos[melhor]] += 1
+            cobertura += colunas[:, melhor]
+            deficit = minimos - cobertura
         
-        num_chapas = len(padroes_finais)
+        if (cobertura > maximos).any():
+            return None
+        
+        return usos
+    
+    def _montar_solucao(self, padroes_usados: List[Tuple[Padrao, int]],
+                       items_pedido: List[Item]) -> SolucaoOtimizacao:
+        
+        if not padroes_usados:
+            return SolucaoOtimizacao(padroes=[], items_cobertos={})
         
-        if num_chapas > 0:
-            aproveitamento_total /= num_chapas
+        padroes_finais = [padrao for padrao, _ in padroes_usados]
+        usos = np.array([qtd_uso for _, qtd_uso in padroes_usados], dtype=np.int64)
+        
+        # Média ponderada pelo número de usos de cada padrão
+        aproveitamentos = np.array([padrao.aproveitamento for padrao in padroes_finais])
+        total_usos = usos.sum()
+        aproveitamento_total = (
+            float(usos @ aproveitamentos / total_usos) if total_usos > 0 else 0.0
+        )
+        
+        # Quantidade produzida por código: agrupa as contribuições
+        # (código, qtd * uso) de todos os padrões
+        codigos = [codigo for padrao in padroes_finais for codigo in padrao.qtd_por_codigo]
+        contribuicoes = np.array([
+            qtd * qtd_uso
+            for padrao, qtd_uso in padroes_usados
+            for qtd in padrao.qtd_por_codigo.values()
+        ], dtype=np.int64)
+        unicos, inverso = np.unique(codigos, return_inverse=True)
+        totais = np.bincount(inverso, weights=contribuicoes, minlength=len(unicos))
+        items_cobertos = dict(zip(unicos.tolist(), totais.astype(np.int64).tolist()))
+        
+        num_chapas = len(padroes_finais)
         
         return SolucaoOtimizacao(
             padroes=padroes_finais,
             aproveitamento_total=aproveitamento_total,
             chapas_necessarias=num_chapas,
             items_cobertos=items_cobertos
-        )
\ No newline at end of file
+        )
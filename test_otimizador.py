@@ -0,0 +1,124 @@
+from itertools import product
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from gerador_padroes import GeradorPadroes
+from gerador_padroes_kernels import precificar_padrao
+from models import Chapa, Item, TipoItem
+from otimizador_ortools import OtimizadorORTools
+
+
+def test_arredondamento_nao_estoura_demanda_exata():
+    # Padrão com 2 peças e demanda exata de 3: nenhum uso inteiro atende
+    otimizador = OtimizadorORTools(Chapa(largura=1200, comprimento=6000, espessura=2))
+    usos = otimizador._arredondar_solucao(
+        np.array([1.5]),
+        {'A': {'min': 3, 'max': 3}},
+        csr_matrix(np.array([[2]]))
+    )
+    assert usos is None
+
+
+def test_arredondamento_repara_deficit_dentro_dos_maximos():
+    otimizador = OtimizadorORTools(Chapa(largura=1200, comprimento=6000, espessura=2))
+    usos = otimizador._arredondar_solucao(
+        np.array([1.5, 0.0]),
+        {'A': {'min': 3, 'max': 3}},
+        csr_matrix(np.array([[2, 1]]))
+    )
+    assert usos.tolist() == [1, 1]
+
+
+def _busca_exaustiva(comprimentos, duais, limites, largura, max_skus):
+    melhor = -np.inf
+    faixas = [range(min(limite, largura // l) + 1)
+              for l, limite in zip(comprimentos, limites)]
+    for quantidades in product(*faixas):
+        if (np.dot(quantidades, comprimentos) == largura
+                and np.count_nonzero(quantidades) <= max_skus):
+            melhor = max(melhor, float(np.dot(quantidades, duais)))
+    return melhor
+
+
+def test_precificacao_igual_a_busca_exaustiva():
+    rng = np.random.default_rng(0)
+    for _ in range(150):
+        n = int(rng.integers(1, 6))
+        largura = int(rng.integers(5, 25))
+        comprimentos = rng.integers(1, largura + 1, n).astype(np.int64)
+        duais = np.round(rng.uniform(0, 2, n), 3)
+        limites = rng.integers(0, 6, n).astype(np.int64)
+        
+        quantidades, valor = precificar_padrao(comprimentos, duais, limites, largura, 3)
+        esperado = _busca_exaustiva(comprimentos, duais, limites, largura, 3)
+        
+        if esperado == -np.inf:
+            assert valor == -np.inf
+            continue
+        
+        assert valor == pytest.approx(esperado)
+        assert int(quantidades @ comprimentos) == largura
+        assert np.all(quantidades <= limites)
+        assert np.count_nonzero(quantidades) <= 3
+        assert float(quantidades @ duais) == pytest.approx(valor)
+
+
+def _demanda_atendida(solucao, items_pedido, items_estoque):
+    cobertos = solucao.items_cobertos
+    return (all(cobertos.get(item.codigo, 0) == item.quantidade for item in items_pedido)
+            and all(cobertos.get(item.codigo, 0) <= item.quantidade for item in items_estoque))
+
+
+def _restricoes(items_pedido, items_estoque):
+    restricoes = {item.codigo: {'min': item.quantidade, 'max': item.quantidade}
+                  for item in items_pedido}
+    restricoes.update({item.codigo: {'min': 0, 'max': item.quantidade}
+                       for item in items_estoque})
+    return restricoes
+
+
+def test_geracao_colunas_atende_demanda_exata():
+    chapa = Chapa(largura=1200, comprimento=6000, espessura=2)
+    items_pedido = [
+        Item("ITEM_A", 200, 1200, 5, TipoItem.PEDIDO),
+        Item("ITEM_B", 300, 1200, 3, TipoItem.PEDIDO),
+        Item("ITEM_C", 150, 1200, 8, TipoItem.PEDIDO),
+    ]
+    items_estoque = [
+        Item("ESTOQUE_001", 250, 1200, 100, TipoItem.ESTOQUE),
+        Item("ESTOQUE_002", 400, 1200, 50, TipoItem.ESTOQUE),
+        Item("ESTOQUE_003", 120, 1200, 80, TipoItem.ESTOQUE),
+    ]
+    otimizador = OtimizadorORTools(chapa, geracao_colunas=True)
+    
+    # As colunas geradas fecham a demanda, sem recorrer à enumeração
+    colunas = otimizador._gerar_colunas(
+        GeradorPadroes(chapa), items_pedido + items_estoque,
+        _restricoes(items_pedido, items_estoque)
+    )
+    assert colunas
+    
+    solucoes = otimizador.otimizar(items_pedido, items_estoque)
+    assert solucoes and solucoes[0].padroes
+    assert all(_demanda_atendida(sol, items_pedido, items_estoque) for sol in solucoes)
+
+
+def test_geracao_colunas_recorre_a_enumeracao():
+    # A demanda residual não fecha com as colunas geradas, mas há plano
+    # exato entre os padrões enumerados
+    chapa = Chapa(largura=12, comprimento=1, espessura=1)
+    items_pedido = [
+        Item("P0", 2, 12, 6, TipoItem.PEDIDO),
+        Item("P1", 4, 12, 4, TipoItem.PEDIDO),
+    ]
+    items_estoque = [Item("E0", 5, 12, 5, TipoItem.ESTOQUE)]
+    otimizador = OtimizadorORTools(chapa, min_aproveitamento=1.0, geracao_colunas=True)
+    
+    assert otimizador._gerar_colunas(
+        GeradorPadroes(chapa, 1.0), items_pedido + items_estoque,
+        _restricoes(items_pedido, items_estoque)
+    ) is None
+    
+    solucoes = otimizador.otimizar(items_pedido, items_estoque)
+    assert solucoes and solucoes[0].padroes
+    assert all(_demanda_atendida(sol, items_pedido, items_estoque) for sol in solucoes)